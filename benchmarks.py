@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+import main
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+# Stored results of "python benchmarks.py --save-baseline" on the reference machine
+
+
+def uncached(function):
+    def run():
+        main.clear_saturation_cache()
+        return function()
+    return run
+
+
+def boiler_graphic_sweep():
+    parameters = list(main.PARAMETER_DEFAULTS)
+    parameters[6] = np.linspace(101.33, 5000, 50)
+    terms = main.boiler_terms(parameters, 16.7, 16.7, 0, 0)
+    return main.boiler_equation_terms(parameters, terms)
+
+
+def compare_fuels_curves():
+    moisture_range = np.linspace(0, 100)
+    return [main.combustion_power(50, fuel[1], moisture_range, 0, fuel[1], moisture_range, 0)
+            for fuel in main.Table_Fuels]
+
+
+def full_report():
+    p_in = 101.33
+    t_in = main.saturated_state('bubble', 'pressure', p_in)[0]
+    m_fuel = main.boiler_equation(15, 80, 100, 16.7, 10, 0, 16.7, 10, 0, 5, 588, 200, p_in, t_in)
+    fuel_enthalpy = main.combustion_power(100, 16.7, 10, 0, 16.7, 10, 0)
+    water_enthalpy = main.h_water_saturated(p_in, t_in) / 1000
+    steam_enthalpy = main.h_steam_superheated(588, 200) / 1000
+    return m_fuel * fuel_enthalpy, water_enthalpy, steam_enthalpy
+
+
+def batch_report(points):
+    rng = np.random.default_rng(0)
+    operating_points = {'fuel': ['Sugarcane bagasse'] * points,
+                        'moisture1': rng.uniform(0, 50, points),
+                        'steam_flow': rng.uniform(5, 30, points),
+                        'steam_pressure': rng.uniform(200, 5000, points),
+                        'steam_temperature': rng.uniform(270, 600, points),
+                        'feedwater_pressure': rng.uniform(101.33, 1000, points),
+                        'efficiency': rng.uniform(60, 90, points),
+                        'blowdown': rng.uniform(0, 10, points)}
+    return lambda: main.evaluate_operating_points(operating_points)
+
+
+def benchmarks():
+    p = np.linspace(200, 5000, 10000)
+    t = np.linspace(300, 600, 10000)
+    w = np.linspace(0, 60, 10000)
+    return [
+        ('heat_vaporization_water', 1, lambda: main.heat_vaporization_water(25)),
+        ('heat_vaporization_water (uncached)', 1, uncached(lambda: main.heat_vaporization_water(25))),
+        ('h_steam_superheated', 1, lambda: main.h_steam_superheated(588, 200)),
+        ('h_water_saturated (uncached)', 1, uncached(lambda: main.h_water_saturated(101.33, 100))),
+        ('h_steam_superheated_array', len(p), lambda: main.h_steam_superheated_array(p, t)),
+        ('h_water_saturated_array', len(p), lambda: main.h_water_saturated_array(p, 100)),
+        ('combustion_power', 1, lambda: main.combustion_power(60, 16.7, 10, 0, 22.73, 5, 0)),
+        ('combustion_power (array)', len(w), lambda: main.combustion_power(60, 16.7, w, 0, 22.73, w, 0)),
+        ('boiler_graphic sweep (50 points)', 50, boiler_graphic_sweep),
+        ('compare_fuels curves', 50 * len(main.Table_Fuels), compare_fuels_curves),
+        ('full report', 1, full_report),
+        ('batch report (10000 rows)', 10000, batch_report(10000)),
+    ]
+
+
+def measure(function, points, repeat):
+    function()
+    latencies = []
+    deadline = time.perf_counter() + 2.0
+    while len(latencies) < repeat and (len(latencies) < 5 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    return {'throughput': points / latencies.mean(),
+            'p50': np.percentile(latencies, 50) * 1000,
+            'p95': np.percentile(latencies, 95) * 1000,
+            'p99': np.percentile(latencies, 99) * 1000,
+            'peak_memory': peak / 1024}
+
+
+def show_results(results, baseline, tolerance):
+    regressions = []
+    name, throughput, p50, p95, p99, memory, change = \
+        'Benchmark:', 'Points/s:', 'p50 (ms):', 'p95 (ms):', 'p99 (ms):', 'Peak (KiB):', 'vs baseline:'
+    print(f'\n{name:<36} {throughput:>14} {p50:>11} {p95:>11} {p99:>11} {memory:>12} {change:>13}')
+    for name, result in results.items():
+        if name in baseline:
+            ratio = result['throughput'] / baseline[name]['throughput']
+            change = f'{100 * (ratio - 1):+.1f}%'
+            if ratio < 1 - tolerance:
+                regressions.append(name)
+                change += ' !'
+        else:
+            change = '-'
+        print(f"{name:<36} {result['throughput']:>14,.0f} {result['p50']:>11.4f} {result['p95']:>11.4f} "
+              f"{result['p99']:>11.4f} {result['peak_memory']:>12,.1f} {change:>13}")
+    return regressions
+
+
+def run(arguments):
+    parser = argparse.ArgumentParser(description='Benchmark the Boiler Energy Calculator hot paths.')
+    parser.add_argument('--repeat', type=int, default=200, help='maximum timed runs per benchmark')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='JSON file of stored baseline results')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed throughput loss against the baseline before failing (fraction)')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    options = parser.parse_args(arguments)
+
+    main.saturation_curves()
+    main.property_tables()
+    results = {name: measure(function, points, options.repeat) for name, points, function in benchmarks()}
+
+    try:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+    except (OSError, ValueError):
+        baseline = {}
+    regressions = show_results(results, baseline, options.tolerance)
+
+    if options.json:
+        with open(options.json, 'w') as file:
+            json.dump(results, file, indent=2)
+    if options.save_baseline:
+        with open(options.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'\nBaseline saved to {options.baseline}')
+    elif regressions:
+        print(f'\nThroughput regressions beyond {100 * options.tolerance:.0f}%: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run(sys.argv[1:]))
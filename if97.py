@@ -0,0 +1,217 @@
+import sys
+import numpy as np
+
+R = 0.461526
+# Specific gas constant of water (kJ/kg K)
+
+REGION1 = [[0, -2, 0.14632971213167], [0, -1, -0.84548187169114], [0, 0, -0.37563603672040e1],
+           [0, 1, 0.33855169168385e1], [0, 2, -0.95791963387872], [0, 3, 0.15772038513228],
+           [0, 4, -0.16616417199501e-1], [0, 5, 0.81214629983568e-3], [1, -9, 0.28319080123804e-3],
+           [1, -7, -0.60706301565874e-3], [1, -1, -0.18990068218419e-1], [1, 0, -0.32529748770505e-1],
+           [1, 1, -0.21841717175414e-1], [1, 3, -0.52838357969930e-4], [2, -3, -0.47184321073267e-3],
+           [2, 0, -0.30001780793026e-3], [2, 1, 0.47661393906987e-4], [2, 3, -0.44141845330846e-5],
+           [2, 17, -0.72694996297594e-15], [3, -4, -0.31679644845054e-4], [3, 0, -0.28270797985312e-5],
+           [3, 6, -0.85205128120103e-9], [4, -5, -0.22425281908000e-5], [4, -2, -0.65171222895601e-6],
+           [4, 10, -0.14341729937924e-12], [5, -8, -0.40516996860117e-6], [8, -11, -0.12734301741641e-8],
+           [8, -6, -0.17424871230634e-9], [21, -29, -0.68762131295531e-18], [23, -31, 0.14478307828521e-19],
+           [29, -38, 0.26335781662795e-22], [30, -39, -0.11947622640071e-22], [31, -40, 0.18228094581404e-23],
+           [32, -41, -0.93537087292458e-25]]
+# Region 1 (liquid) dimensionless Gibbs free energy: exponents I, J and coefficient n of each term
+
+REGION2_IDEAL = [[0, -0.96927686500217e1], [1, 0.10086655968018e2], [-5, -0.56087911283020e-2],
+                 [-4, 0.71452738081455e-1], [-3, -0.40710498223928], [-2, 0.14240819171444e1],
+                 [-1, -0.43839511319450e1], [2, -0.28408632460772], [3, 0.21268463753307e-1]]
+# Region 2 (vapour) ideal-gas part: exponent J and coefficient n of each term
+
+REGION2_RESIDUAL = [[1, 0, -0.17731742473213e-2], [1, 1, -0.17834862292358e-1], [1, 2, -0.45996013696365e-1],
+                    [1, 3, -0.57581259083432e-1], [1, 6, -0.50325278727930e-1], [2, 1, -0.33032641670203e-4],
+                    [2, 2, -0.18948987516315e-3], [2, 4, -0.39392777243355e-2], [2, 7, -0.43797295650573e-1],
+                    [2, 36, -0.26674547914087e-4], [3, 0, 0.20481737692309e-7], [3, 1, 0.43870667284435e-6],
+                    [3, 3, -0.32277677238570e-4], [3, 6, -0.15033924542148e-2], [3, 35, -0.40668253562649e-1],
+                    [4, 1, -0.78847309559367e-9], [4, 2, 0.12790717852285e-7], [4, 3, 0.48225372718507e-6],
+                    [5, 7, 0.22922076337661e-5], [6, 3, -0.16714766451061e-10], [6, 16, -0.21171472321355e-2],
+                    [6, 35, -0.23895741934104e2], [7, 0, -0.59059564324270e-17], [7, 11, -0.12621808899101e-5],
+                    [7, 25, -0.38946842435739e-1], [8, 8, 0.11256211360459e-10], [8, 36, -0.82311340897998e1],
+                    [9, 13, 0.19809712802088e-7], [10, 4, 0.10406965210174e-18], [10, 10, -0.10234747095929e-12],
+                    [10, 14, -0.10018179379511e-8], [16, 29, -0.80882908646985e-10], [16, 50, 0.10693031879409],
+                    [18, 57, -0.33662250574171], [20, 20, 0.89185845355421e-24], [20, 35, 0.30629316876232e-12],
+                    [20, 48, -0.42002467698208e-5], [21, 21, -0.59056029685639e-25], [22, 53, 0.37826947613457e-5],
+                    [23, 39, -0.12768608934681e-14], [24, 26, 0.73087610595061e-28], [24, 40, 0.55414715350778e-16],
+                    [24, 58, -0.94369707241210e-6]]
+# Region 2 residual part: exponents I, J and coefficient n of each term
+
+REGION4 = [0.11670521452767e4, -0.72421316703206e6, -0.17073846940092e2, 0.12020824702470e5,
+           -0.32325550322333e7, 0.14915108613530e2, -0.48232657361591e4, 0.40511340542057e6,
+           -0.23855557567849, 0.65017534844798e3]
+# Region 4 (saturation line) coefficients n1 to n10
+
+B23 = [0.34805185628969e3, -0.11671859879975e1, 0.10192970039326e-2]
+# Boundary between regions 2 and 3: p (MPa) = n1 + n2 T + n3 T²
+
+T_MIN, T_REGION1_MAX, T_MAX, T_CRITICAL = 273.15, 623.15, 1073.15, 647.096
+P_MAX = 100.0
+# Validity limits of the implemented regions (K, MPa)
+
+
+def kelvin_megapascal(p, t):
+    # kPa and °C in, K and MPa out, broadcast together
+    p, t = np.broadcast_arrays(np.asarray(p, dtype=float), np.asarray(t, dtype=float))
+    return p / 1000, t + 273.15
+
+
+def series_derivative(x, y, terms):
+    # Σ n x^I J y^(J-1) over the rows [I, J, n] of terms
+    terms = np.array(terms)
+    i, j, n = terms[:, 0], terms[:, 1], terms[:, 2]
+    return np.sum(n * x[..., np.newaxis]**i * j * y[..., np.newaxis]**(j - 1), axis=-1)
+
+
+def region1_enthalpy(p, t):
+    # Liquid enthalpy (kJ/kg) for p in MPa and t in K
+    tau = 1386 / t
+    return R * t * tau * series_derivative(7.1 - p / 16.53, tau - 1.222, REGION1)
+
+
+def region2_enthalpy(p, t):
+    # Vapour enthalpy (kJ/kg) for p in MPa and t in K
+    tau = 540 / t
+    ideal = np.array(REGION2_IDEAL)
+    ideal = np.sum(ideal[:, 1] * ideal[:, 0] * tau[..., np.newaxis]**(ideal[:, 0] - 1), axis=-1)
+    return R * t * tau * (ideal + series_derivative(p, tau - 0.5, REGION2_RESIDUAL))
+
+
+def region4_pressure(t):
+    # Saturation pressure (MPa) for t in K
+    n = REGION4
+    theta = t + n[8] / (t - n[9])
+    a = theta**2 + n[0]*theta + n[1]
+    b = n[2]*theta**2 + n[3]*theta + n[4]
+    c = n[5]*theta**2 + n[6]*theta + n[7]
+    return (2*c / (-b + np.sqrt(b**2 - 4*a*c)))**4
+
+
+def region4_temperature(p):
+    # Saturation temperature (K) for p in MPa
+    n = REGION4
+    beta = p**0.25
+    e = beta**2 + n[2]*beta + n[5]
+    f = n[0]*beta**2 + n[3]*beta + n[6]
+    g = n[1]*beta**2 + n[4]*beta + n[7]
+    d = 2*g / (-f - np.sqrt(f**2 - 4*e*g))
+    return (n[9] + d - np.sqrt((n[9] + d)**2 - 4*(n[8] + n[9]*d))) / 2
+
+
+def saturation_pressure(t):
+    # kPa for t in °C; NaN outside the saturation line
+    t = np.asarray(t, dtype=float) + 273.15
+    with np.errstate(invalid='ignore'):
+        return np.where((t >= T_MIN) & (t <= T_CRITICAL), 1000 * region4_pressure(t), np.nan)
+
+
+def saturation_temperature(p):
+    # °C for p in kPa; NaN outside the saturation line
+    p = np.asarray(p, dtype=float) / 1000
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = region4_temperature(np.maximum(p, 0))
+    return np.where((t >= T_MIN) & (t <= T_CRITICAL) & (p > 0), t - 273.15, np.nan)
+
+
+def enthalpy(p, t):
+    # Enthalpy (kJ/kg) of compressed liquid or superheated steam at p kPa and t °C; NaN in region 3, at the
+    # saturation line itself and outside the validity range of the equations
+    p, t = kelvin_megapascal(p, t)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        p_saturation = np.where(t <= T_REGION1_MAX, region4_pressure(np.minimum(t, T_REGION1_MAX)), np.inf)
+        p_boundary = np.where(t > T_REGION1_MAX, B23[0] + B23[1]*t + B23[2]*t**2, np.inf)
+        valid = (t >= T_MIN) & (t <= T_MAX) & (p > 0) & (p <= P_MAX)
+        liquid = valid & (p > p_saturation)
+        vapour = valid & (p < p_saturation) & (p <= p_boundary)
+        result = np.full(p.shape, np.nan)
+        result[liquid] = region1_enthalpy(p[liquid], t[liquid])
+        result[vapour] = region2_enthalpy(p[vapour], t[vapour])
+    return result
+
+
+def saturated_enthalpy(phase, p, t):
+    # Enthalpy (kJ/kg) of the saturated liquid ('bubble') or vapour ('dew') at the saturation state (p kPa, t °C)
+    p, t = kelvin_megapascal(p, t)
+    valid = np.isfinite(p) & np.isfinite(t) & (t >= T_MIN) & (t <= T_REGION1_MAX)
+    result = np.full(p.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        result[valid] = (region1_enthalpy if phase == 'bubble' else region2_enthalpy)(p[valid], t[valid])
+    return result
+
+
+def saturation_state(phase, given, value):
+    # Vectorized counterpart of main.saturated_state: (temperature °C, pressure kPa, enthalpy kJ/kg)
+    value = np.asarray(value, dtype=float)
+    if given == 'pressure':
+        t, p = saturation_temperature(value), value
+    else:
+        t, p = value, saturation_pressure(value)
+    return t, p, saturated_enthalpy(phase, p, t)
+
+
+VERIFICATION = [('h region 1', region1_enthalpy, (3, 300), 115.331273),
+                ('h region 1', region1_enthalpy, (80, 300), 184.142828),
+                ('h region 1', region1_enthalpy, (3, 500), 975.542239),
+                ('h region 2', region2_enthalpy, (0.0035, 300), 2549.91145),
+                ('h region 2', region2_enthalpy, (0.0035, 700), 3335.68375),
+                ('h region 2', region2_enthalpy, (30, 700), 2631.49474),
+                ('p saturation', region4_pressure, (300,), 0.00353658941),
+                ('p saturation', region4_pressure, (500,), 2.63889776),
+                ('T saturation', region4_temperature, (0.1,), 372.755919),
+                ('T saturation', region4_temperature, (10,), 584.149488)]
+# Computer-program verification values of the IF97 release (p in MPa, T in K, h in kJ/kg), 9 significant digits
+
+TOLERANCES = {'enthalpy (kJ/kg)': 0.3, 'saturated liquid enthalpy (kJ/kg)': 0.3,
+              'saturated vapour enthalpy (kJ/kg)': 0.3, 'saturation temperature (K)': 0.02,
+              'saturation pressure (%)': 0.025}
+# Largest accepted differences against pyfluids (CoolProp's IAPWS-95), the order of the IF97 deviations from
+# IAPWS-95 in the boiler range (1-5000 kPa, 0-800 °C)
+
+
+def cross_validation(points=2000, seed=0):
+    # Largest differences against pyfluids over random states of the boiler range
+    from pyfluids import Fluid, FluidsList, Input
+    rng = np.random.default_rng(seed)
+    p, t = rng.uniform(1, 5000, points), rng.uniform(0.1, 800, points)
+    p_sat, t_sat = np.geomspace(1, 5000, points), np.linspace(0.01, 310, points)
+
+    def with_state(p, t):
+        return Fluid(FluidsList.Water).with_state(Input.temperature(t), Input.pressure(1000*p)).enthalpy/1000
+
+    water = Fluid(FluidsList.Water)
+    bubble = [water.bubble_point_at_pressure(1000*x) for x in p_sat] + \
+        [water.bubble_point_at_temperature(x) for x in t_sat]
+    bubble = np.array([[point.temperature, point.pressure/1000, point.enthalpy/1000] for point in bubble])
+    dew = np.array([water.dew_point_at_pressure(1000*x).enthalpy/1000 for x in p_sat] +
+                   [water.dew_point_at_temperature(x).enthalpy/1000 for x in t_sat])
+    liquid = np.concatenate([saturation_state('bubble', 'pressure', p_sat)[2],
+                             saturation_state('bubble', 'temperature', t_sat)[2]])
+    vapour = np.concatenate([saturation_state('dew', 'pressure', p_sat)[2],
+                             saturation_state('dew', 'temperature', t_sat)[2]])
+    return {'enthalpy (kJ/kg)': np.abs(enthalpy(p, t) - [with_state(*state) for state in zip(p, t)]).max(),
+            'saturated liquid enthalpy (kJ/kg)': np.abs(liquid - bubble[:, 2]).max(),
+            'saturated vapour enthalpy (kJ/kg)': np.abs(vapour - dew).max(),
+            'saturation temperature (K)': np.abs(saturation_temperature(p_sat) - bubble[:points, 0]).max(),
+            'saturation pressure (%)': 100 * np.abs(saturation_pressure(t_sat) / bubble[points:, 1] - 1).max()}
+
+
+def run():
+    failures = 0
+    print('IF97 verification values:')
+    for name, function, arguments, expected in VERIFICATION:
+        value = function(*[np.array(float(x)) for x in arguments])
+        failures += abs(value / expected - 1) > 1e-8
+        print(f'  {name:<14} at {str(arguments):<14} {value:>16.9g}   (expected {expected})')
+
+    print('\nLargest differences against pyfluids:')
+    for name, difference in cross_validation().items():
+        failures += difference > TOLERANCES[name]
+        print(f'  {name:<36} {difference:>10.4f}   tolerance {TOLERANCES[name]}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+
+import main
+
+HOST = '127.0.0.1'
+EQUATIONS = {
+    '/boiler_equation': ('boiler_equation_array', ['m_steam', 'eff', 'x1', 'e1', 'w1', 'hc1', 'e2', 'w2', 'hc2',
+                                                   'b', 'p_out', 't_out', 'p_in', 't_in']),
+    '/efficiency_equation': ('efficiency_equation_array', ['m_steam', 'm_fuel', 'x1', 'e1', 'w1', 'hc1', 'e2', 'w2',
+                                                           'hc2', 'b', 'p_out', 't_out', 'p_in', 't_in']),
+    '/combustion_power': ('combustion_power', ['x1', 'e1', 'w1', 'hc1', 'e2', 'w2', 'hc2']),
+}
+# Endpoint, function of main.py evaluated for the whole batch, arguments (numbers or lists of numbers)
+
+Pending = {}
+# (endpoint, settings) -> requests waiting for the next batch evaluation
+Server_Options = {'window': 0.005, 'max_batch': 100000, 'pool': None}
+
+
+def finite_values(value):
+    # NaN and infinite figures have no JSON representation, so they are sent as null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: finite_values(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite_values(item) for item in value]
+    return value
+
+
+def json_content(value):
+    try:
+        return json.dumps(value, allow_nan=False).encode()
+    except ValueError:
+        return json.dumps(finite_values(value), allow_nan=False).encode()
+
+
+def warm_up(*args):
+    # Maps the saturation curves, loads the property tables and the fuel store in a worker before the first
+    # request reaches it
+    if main.Fuel_Database is None:
+        main.open_fuel_database()
+    main.saturation_curves()
+    main.property_tables()
+    main.heat_vaporization_water(25)
+
+
+def evaluate_equation(name, arguments, settings):
+    return getattr(main, name)(**arguments, settings=settings)
+
+
+def evaluate_report(rows, settings):
+    results = main.evaluate_operating_points(main.operating_point_columns(rows), settings)
+    return {name: values.tolist() for name, values in results.items()}
+
+
+def request_settings(payload):
+    settings = main.current_settings()
+    try:
+        values = dict(payload.get('settings', {}))
+        settings = settings._replace(**values)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f'Invalid settings: {error}')
+    flags = [name for name, value in values.items() if name != 'property_backend' and not isinstance(value, bool)]
+    if flags:
+        raise ValueError(f'Invalid settings: {", ".join(flags)} must be true or false')
+    if settings.property_backend not in main.PROPERTY_BACKENDS:
+        raise ValueError(f'Invalid settings: unknown property backend {settings.property_backend}')
+    return settings
+
+
+def equation_arguments(endpoint, payload):
+    names = EQUATIONS[endpoint][1]
+    missing = [name for name in names if name not in payload]
+    if missing:
+        raise ValueError(f'Missing arguments: {", ".join(missing)}')
+    try:
+        arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(payload[name], dtype=float)) for name in names])
+    except ValueError as error:
+        raise ValueError(f'Invalid arguments: {error}')
+    scalar = all(np.ndim(payload[name]) == 0 for name in names)
+    return dict(zip(names, [a.ravel() for a in arrays])), scalar
+
+
+def report_rows(payload):
+    rows = payload.get('points')
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        raise ValueError('"points" must be a non-empty list of operating points')
+    fuels = {fuel[0].lower() for fuel in main.Table_Fuels}
+    unknown = {str(row.get(key)) for row in rows for key in ('fuel', 'fuel2')
+               if row.get(key) and str(row.get(key)).strip().lower() not in fuels}
+    if unknown:
+        raise ValueError(f'Fuel not registered: {", ".join(sorted(unknown))}')
+    return rows
+
+
+async def flush(key):
+    # Evaluates every request queued under key as a single vectorized call in the worker pool
+    batch = Pending.pop(key, {'requests': []})['requests']
+    if not batch:
+        return
+    endpoint, settings = key
+    loop = asyncio.get_running_loop()
+    try:
+        if endpoint == '/report':
+            rows = [row for request, future in batch for row in request]
+            results = await loop.run_in_executor(Server_Options['pool'], partial(evaluate_report, rows, settings))
+            start = 0
+            for request, future in batch:
+                stop = start + len(request)
+                future.set_result([{name: values[n] for name, values in results.items()} for n in range(start, stop)])
+                start = stop
+        else:
+            names = EQUATIONS[endpoint][1]
+            arguments = {name: np.concatenate([request[name] for request, future in batch]) for name in names}
+            function = partial(evaluate_equation, EQUATIONS[endpoint][0], arguments, settings)
+            results = await loop.run_in_executor(Server_Options['pool'], function)
+            start = 0
+            for request, future in batch:
+                stop = start + len(request[names[0]])
+                future.set_result(results[start:stop].tolist())
+                start = stop
+    except Exception:
+        # One invalid request fails the whole vectorized call; evaluate them one by one so only it gets the error
+        for request, future in batch:
+            if future.done():
+                continue
+            try:
+                if endpoint == '/report':
+                    result = await loop.run_in_executor(Server_Options['pool'],
+                                                        partial(evaluate_report, request, settings))
+                    future.set_result([{name: values[n] for name, values in result.items()}
+                                       for n in range(len(request))])
+                else:
+                    function = partial(evaluate_equation, EQUATIONS[endpoint][0], request, settings)
+                    future.set_result((await loop.run_in_executor(Server_Options['pool'], function)).tolist())
+            except Exception as error:
+                future.set_exception(error)
+
+
+async def queue_request(key, request, size):
+    # Requests with the same endpoint and settings arriving within the coalescing window share one evaluation
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    if key not in Pending:
+        Pending[key] = {'requests': [], 'points': 0}
+        loop.call_later(Server_Options['window'], lambda: asyncio.ensure_future(flush(key)))
+    Pending[key]['requests'].append((request, future))
+    Pending[key]['points'] += size
+    if Pending[key]['points'] >= Server_Options['max_batch']:
+        asyncio.ensure_future(flush(key))
+    return await future
+
+
+async def handle_request(method, path, body):
+    if method == 'GET' and path == '/health':
+        return 200, {'status': 'ok', 'endpoints': sorted(list(EQUATIONS) + ['/report'])}
+    if method != 'POST' or (path not in EQUATIONS and path != '/report'):
+        return 404, {'error': f'Unknown endpoint {method} {path}'}
+    try:
+        payload = json.loads(body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError('The request body must be a JSON object')
+        settings = request_settings(payload)
+        if path == '/report':
+            rows = report_rows(payload)
+            return 200, {'results': await queue_request((path, settings), rows, len(rows))}
+        arguments, scalar = equation_arguments(path, payload)
+        result = await queue_request((path, settings), arguments, len(next(iter(arguments.values()))))
+        return 200, {'result': result[0] if scalar else result}
+    except ValueError as error:
+        return 400, {'error': str(error)}
+    except Exception as error:
+        return 500, {'error': str(error)}
+
+
+async def serve_connection(reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, version = request_line.decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, value = line.decode('latin-1').split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+            status, response = await handle_request(method, path, body)
+            content = json_content(response)
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            writer.write(f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                         f'Content-Type: application/json\r\nContent-Length: {len(content)}\r\n'
+                         f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode() + content)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_server(port, workers):
+    main.open_fuel_database()
+    main.saturation_curves()
+    main.property_tables()
+    Server_Options['pool'] = ProcessPoolExecutor(max_workers=workers, initializer=warm_up)
+    list(Server_Options['pool'].map(warm_up, range(workers)))
+    server = await asyncio.start_server(serve_connection, HOST, port)
+    print(f'Boiler Energy Calculator service listening on http://{HOST}:{port}')
+    async with server:
+        await server.serve_forever()
+
+
+async def call(endpoint, payload, port, reader=None, writer=None):
+    # Minimal keep-alive JSON client; returns (status, response, reader, writer) so the connection can be reused
+    if reader is None:
+        reader, writer = await asyncio.open_connection(HOST, port)
+    content = json_content(payload)
+    writer.write(f'POST {endpoint} HTTP/1.1\r\nHost: {HOST}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(content)}\r\n\r\n'.encode() + content)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, value = line.decode('latin-1').split(':', 1)
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    return status, json.loads(body), reader, writer
+
+
+async def load_test(port, requests, concurrency, points):
+    rng = np.random.default_rng(0)
+    latencies, errors = [], 0
+
+    async def worker(count):
+        nonlocal errors
+        reader = writer = None
+        for n in range(count):
+            payload = {'m_steam': 15, 'eff': rng.uniform(60, 90, points).tolist(), 'x1': 100, 'e1': 16.7,
+                       'w1': rng.uniform(0, 50, points).tolist(), 'hc1': 0, 'e2': 16.7, 'w2': 10, 'hc2': 0, 'b': 5,
+                       'p_out': rng.uniform(200, 5000, points).tolist(), 't_out': 400, 'p_in': 101.33, 't_in': 100}
+            start = time.perf_counter()
+            status, response, reader, writer = await call('/boiler_equation', payload, port, reader, writer)
+            latencies.append(time.perf_counter() - start)
+            errors += status != 200
+        if writer is not None:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(requests // concurrency + (n < requests % concurrency)) for n in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies = 1000 * np.array(latencies)
+    print(f'{len(latencies)} requests of {points} points in {elapsed:.2f} s ({errors} errors)')
+    print(f'Requests/s: {len(latencies) / elapsed:,.0f}   Points/s: {len(latencies) * points / elapsed:,.0f}')
+    print(f'Latency (ms): p50 {np.percentile(latencies, 50):.2f}   p95 {np.percentile(latencies, 95):.2f}   '
+          f'p99 {np.percentile(latencies, 99):.2f}')
+
+
+def run(arguments):
+    parser = argparse.ArgumentParser(description='Local JSON-over-HTTP service for the Boiler Energy Calculator.')
+    parser.add_argument('command', choices=['serve', 'load-test'])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes for the evaluations')
+    parser.add_argument('--window', type=float, default=5.0, help='request coalescing window (ms)')
+    parser.add_argument('--requests', type=int, default=1000, help='load test: number of requests')
+    parser.add_argument('--concurrency', type=int, default=50, help='load test: concurrent connections')
+    parser.add_argument('--points', type=int, default=10, help='load test: operating points per request')
+    options = parser.parse_args(arguments)
+
+    if options.command == 'serve':
+        Server_Options['window'] = options.window / 1000
+        try:
+            asyncio.run(run_server(options.port, options.workers))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(load_test(options.port, options.requests, options.concurrency, options.points))
+
+
+if __name__ == '__main__':
+    run(sys.argv[1:])
@@ -0,0 +1,156 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+import main
+
+REFERENCE = {'use_property_tables': False, 'property_backend': 'pyfluids'}
+CANDIDATES = {'property tables': {'use_property_tables': True, 'property_backend': 'pyfluids'},
+              'if97': {'use_property_tables': False, 'property_backend': 'if97'}}
+# Settings of the reference pyfluids path and of every candidate path compared with it
+
+CONFIGURATIONS = [(saturated, water_pressure, higher) for saturated in (False, True)
+                  for water_pressure in (True, False) for higher in (False, True)]
+# Steam state, feedwater input and heating value method of each stratum
+SUPERHEAT_MARGIN = 1.0
+# Superheated points closer than this (°C) to the saturation temperature, or below it, are not compared
+MIN_NET_HEATING_VALUE = 2.0
+# Blends below this net heating value (MJ/kg) are not compared: the fuel flow grows without bound as it tends to
+# zero, so a negligible difference in the heat of vaporization turns into an arbitrarily large relative error
+
+
+def configuration_name(saturated, water_pressure, higher):
+    return (f"{'saturated' if saturated else 'superheated'} / feedwater {'p' if water_pressure else 'T'} / "
+            f"{'HHV' if higher else 'LHV'}")
+
+
+def latin_hypercube(rng, points, ranges):
+    # One sample in each of `points` equal strata of every range, with the strata shuffled per parameter
+    strata = rng.permuted(np.tile(np.arange(points), (len(ranges), 1)), axis=1) + rng.random((len(ranges), points))
+    low, high = np.array(ranges, dtype=float).T
+    return low[:, np.newaxis] + strata / points * (high - low)[:, np.newaxis]
+
+
+def operating_points(rng, points, settings):
+    # boiler_equation_array arguments covering the slider ranges, with two registered fuels per point; the
+    # dependent saturation states are completed as in evaluate_operating_points with the reference path. Also
+    # returns which points are compared: actually superheated steam, and blends that pass moisture_validation
+    eff, m_steam, b, w1, w2, x1, p_out, t_out, p_in, t_in = latin_hypercube(rng, points, main.SLIDER_RANGES)
+    if settings.use_water_pressure:
+        t_in = main.saturation_temperature_array(p_in, settings)
+    else:
+        p_in = main.saturation_pressure_array(t_in, settings)
+    t_sat = main.saturation_temperature_array(p_out, settings)
+    physical = t_out > t_sat + SUPERHEAT_MARGIN
+    if settings.saturated_steam:
+        t_out, physical = t_sat, np.ones(points, dtype=bool)
+    higher = settings.use_higher
+    fuels = np.array([fuel[1:] for fuel in main.Table_Fuels if '' not in fuel[1:]], dtype=float)
+    first, second = rng.integers(len(fuels), size=(2, points))
+    column = 1 if higher else 0
+    hc1, hc2 = (fuels[first, 2], fuels[second, 2]) if higher else (0.0, 0.0)
+    e1, e2 = fuels[first, column], fuels[second, column]
+
+    heat_vaporization = main.heat_vaporization_water(25, settings)
+    combustible = (w1 < 100*e1/(e1 + heat_vaporization)) & (w2 < 100*e2/(e2 + heat_vaporization)) & \
+        (main.combustion_power(x1, e1, w1, hc1, e2, w2, hc2, settings) > MIN_NET_HEATING_VALUE)
+    return {'m_steam': m_steam, 'eff': eff, 'x1': x1, 'e1': e1, 'w1': w1, 'hc1': hc1, 'e2': e2, 'w2': w2,
+            'hc2': hc2, 'b': b, 'p_out': p_out, 't_out': t_out, 'p_in': p_in, 't_in': t_in}, physical & combustible
+
+
+def timed(arguments, settings, repeat=1):
+    seconds = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        values = main.boiler_equation_array(**arguments, settings=settings)
+        seconds.append(time.perf_counter() - start)
+    return values, min(seconds)
+
+
+def compare(reference, candidate):
+    # Relative error of the fuel consumption where the reference is a physical (finite, positive) figure
+    valid = np.isfinite(reference) & (reference > 0)
+    error = np.abs(candidate[valid] / reference[valid] - 1)
+    error = np.where(np.isfinite(error), error, np.inf)
+    return {'points': int(valid.sum()), 'excluded': int((~valid).sum()), 'max_error': float(error.max()),
+            'mean_error': float(error.mean())}
+
+
+def validate(points, seed, candidates):
+    rng = np.random.default_rng(seed)
+    main.saturation_curves()
+    main.property_tables()
+    rows, totals = [], {name: {'errors': [], 'reference': 0.0, 'candidate': 0.0} for name in candidates}
+    for saturated, water_pressure, higher in CONFIGURATIONS:
+        base = main.current_settings()._replace(saturated_steam=saturated, use_water_pressure=water_pressure,
+                                                use_higher=higher)
+        arguments, physical = operating_points(rng, points, base._replace(**REFERENCE))
+        arguments = {name: values[physical] if np.ndim(values) else values for name, values in arguments.items()}
+        main.clear_saturation_cache()
+        reference, reference_time = timed(arguments, base._replace(**REFERENCE))
+        valid = np.isfinite(reference) & (reference > 0)
+        for name in candidates:
+            settings = base._replace(**CANDIDATES[name])
+            timed(arguments, settings)
+            values, candidate_time = timed(arguments, settings, repeat=3)
+            row = compare(reference, values)
+            row['excluded'] += points - int(physical.sum())
+            row.update({'configuration': configuration_name(saturated, water_pressure, higher), 'candidate': name,
+                        'reference_seconds': reference_time, 'candidate_seconds': candidate_time,
+                        'speedup': reference_time / candidate_time})
+            rows.append(row)
+            totals[name]['errors'].append(np.abs(values[valid] / reference[valid] - 1))
+            totals[name]['reference'] += reference_time
+            totals[name]['candidate'] += candidate_time
+
+    for name, total in totals.items():
+        errors = np.concatenate(total['errors'])
+        rows.append({'configuration': 'All', 'candidate': name, 'points': len(errors),
+                     'excluded': sum(row['excluded'] for row in rows if row['candidate'] == name),
+                     'max_error': float(errors.max()), 'mean_error': float(errors.mean()),
+                     'reference_seconds': total['reference'], 'candidate_seconds': total['candidate'],
+                     'speedup': total['reference'] / total['candidate']})
+    return rows
+
+
+def show_results(rows):
+    configuration, points, excluded, candidate, max_error, mean_error, reference, seconds, speedup = \
+        'Configuration:', 'Points:', 'Excluded:', 'Candidate:', 'Max rel. error:', 'Mean rel. error:', \
+        'Reference (s):', 'Candidate (s):', 'Speedup:'
+    print(f'\n{configuration:<32} {points:>7} {excluded:>9} {candidate:<16} {max_error:>16} {mean_error:>16} '
+          f'{reference:>14} {seconds:>14} {speedup:>10}')
+    for row in rows:
+        print(f"{row['configuration']:<32} {row['points']:>7} {row['excluded']:>9} {row['candidate']:<16} "
+              f"{row['max_error']:>16.3e} "
+              f"{row['mean_error']:>16.3e} {row['reference_seconds']:>14.3f} {row['candidate_seconds']:>14.5f} "
+              f"{row['speedup']:>9,.0f}x")
+
+
+def run(arguments):
+    parser = argparse.ArgumentParser(
+        description='Compare the fuel consumption of faster property paths with the reference pyfluids path.')
+    parser.add_argument('--points', type=int, default=1000, help='operating points sampled per configuration')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--candidates', nargs='+', choices=list(CANDIDATES), default=list(CANDIDATES))
+    parser.add_argument('--tolerance', type=float, default=1e-3,
+                        help='largest accepted relative error of the fuel consumption')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    options = parser.parse_args(arguments)
+
+    rows = validate(options.points, options.seed, options.candidates)
+    show_results(rows)
+    if options.json:
+        with open(options.json, 'w') as file:
+            json.dump(rows, file, indent=2)
+
+    failures = sorted({row['candidate'] for row in rows if row['max_error'] > options.tolerance})
+    if failures:
+        print(f'\nRelative error above {options.tolerance:g}: {", ".join(failures)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run(sys.argv[1:]))